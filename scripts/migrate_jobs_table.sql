@@ -0,0 +1,43 @@
+-- Upgrade a jobs table created by an earlier release of qgjob.
+--
+-- create_tables() only creates missing tables, so a table created before the column
+-- type changes below keeps its old schema until this script runs. Stop the API and
+-- workers first, then run it once:
+--
+--   psql "$DATABASE_URL" -f scripts/migrate_jobs_table.sql
+
+BEGIN;
+
+-- Job.result: JSON text -> JSONB
+ALTER TABLE jobs ALTER COLUMN result TYPE JSONB USING result::jsonb;
+
+-- Job.status / Job.target: native enums (stored by member name) -> SMALLINT codes,
+-- numbered in the enums' declaration order as CodedEnum expects
+ALTER TABLE jobs ALTER COLUMN status DROP DEFAULT;
+ALTER TABLE jobs ALTER COLUMN status TYPE SMALLINT USING (
+    CASE status::text WHEN 'QUEUED' THEN 0 WHEN 'PROCESSING' THEN 1 WHEN 'COMPLETED' THEN 2 WHEN 'FAILED' THEN 3 END
+);
+ALTER TABLE jobs ALTER COLUMN status SET DEFAULT 0;
+ALTER TABLE jobs ALTER COLUMN status SET NOT NULL;
+ALTER TABLE jobs ALTER COLUMN target TYPE SMALLINT USING (
+    CASE target::text WHEN 'EMULATOR' THEN 0 WHEN 'DEVICE' THEN 1 WHEN 'BROWSERSTACK' THEN 2 END
+);
+DROP TYPE IF EXISTS jobstatus;
+DROP TYPE IF EXISTS jobtarget;
+
+-- Timestamps are filled in by the database, since submits insert without them
+UPDATE jobs SET created_at = now() WHERE created_at IS NULL;
+UPDATE jobs SET updated_at = created_at WHERE updated_at IS NULL;
+ALTER TABLE jobs ALTER COLUMN created_at SET DEFAULT now();
+ALTER TABLE jobs ALTER COLUMN created_at SET NOT NULL;
+ALTER TABLE jobs ALTER COLUMN updated_at SET DEFAULT now();
+ALTER TABLE jobs ALTER COLUMN updated_at SET NOT NULL;
+
+-- GET /jobs keyset pagination
+CREATE INDEX IF NOT EXISTS ix_jobs_created_id ON jobs (created_at DESC, id DESC);
+-- /metrics status counts
+CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status);
+-- Database claim of queued jobs (status 0 is QUEUED)
+CREATE INDEX IF NOT EXISTS ix_jobs_dequeue ON jobs (priority, created_at) WHERE status = 0;
+
+COMMIT;
@@ -275,7 +275,7 @@ fi
 
 # Start API server
 log "INFO" "🌐 Starting API server..."
-python3 -m src.qgjob.main >> "$LOG_FILE" 2>&1 &
+python3 -m qgjob.main >> "$LOG_FILE" 2>&1 &
 API_PID=$!
 log "INFO" "API server started (PID: $API_PID)"
 
@@ -302,7 +302,7 @@ fi
 
 # Start worker process
 log "INFO" "👷 Starting worker process..."
-python3 -m src.qgjob.worker >> "$LOG_FILE" 2>&1 &
+python3 -m qgjob.worker >> "$LOG_FILE" 2>&1 &
 WORKER_PID=$!
 log "INFO" "Worker process started (PID: $WORKER_PID)"
 
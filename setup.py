@@ -7,7 +7,7 @@ setup(
     package_dir={"": "src"},
     install_requires=[
         "click>=8.0.0",
-        "requests>=2.25.0",
+        "httpx[http2]>=0.25.0",
     ],
     entry_points={
         "console_scripts": [
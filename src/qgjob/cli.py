@@ -1,5 +1,5 @@
 import click
-import requests
+import httpx
 import json
 import time
 import os
@@ -8,6 +8,31 @@ from typing import Optional
 
 API_BASE_URL = os.getenv("QGJOB_API_URL", "http://localhost:8000")
 TIMEOUT = 30
+MIN_POLL_INTERVAL = 0.5
+POLL_BACKOFF_FACTOR = 1.5
+BATCH_SIZE = 100
+PAGE_SIZE = 100
+
+STATUS_COLORS = {
+    "queued": "yellow",
+    "processing": "blue",
+    "completed": "green",
+    "failed": "red"
+}
+# Padded before styling so ANSI escape codes don't throw off column alignment in `list`
+STATUS_STYLED = {status: click.style(status.upper().ljust(12), fg=color) for status, color in STATUS_COLORS.items()}
+ISO_T_TO_SPACE = str.maketrans("T", " ")
+
+# Shared HTTP/2 client so repeated calls (e.g. `wait` polling) multiplex over one connection
+_client = httpx.Client(
+    base_url=API_BASE_URL,
+    timeout=TIMEOUT,
+    transport=httpx.HTTPTransport(http2=True, retries=3, limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)),
+    headers={
+        "User-Agent": "qgjob-cli/1.0.0",
+        "Accept": "application/json"
+    }
+)
 
 def handle_api_error(response):
     try:
@@ -40,7 +65,7 @@ def submit(org_id, app_version_id, test, priority, target):
     }
     
     try:
-        response = requests.post(f"{API_BASE_URL}/jobs", json=payload, timeout=TIMEOUT)
+        response = _client.post("/jobs", json=payload)
         
         if response.status_code == 200:
             result = response.json()
@@ -55,33 +80,76 @@ def submit(org_id, app_version_id, test, priority, target):
             click.echo(click.style(f"✗ Error submitting job: {error_detail}", fg="red"), err=True)
             sys.exit(1)
             
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         click.echo(click.style("✗ Request timed out", fg="red"), err=True)
         sys.exit(1)
-    except requests.exceptions.ConnectionError:
+    except httpx.NetworkError:
         click.echo(click.style(f"✗ Cannot connect to API server at {API_BASE_URL}", fg="red"), err=True)
         sys.exit(1)
     except Exception as e:
         click.echo(click.style(f"✗ Unexpected error: {e}", fg="red"), err=True)
         sys.exit(1)
 
+def post_job_batch(jobs):
+    response = _client.post("/jobs/batch", json=jobs)
+    
+    if response.status_code != 200:
+        error_detail = handle_api_error(response)
+        click.echo(click.style(f"✗ Error submitting job batch: {error_detail}", fg="red"), err=True)
+        sys.exit(1)
+    
+    for result in response.json():
+        click.echo(f"{result['job_id']} {result['status']}")
+    return len(jobs)
+
+@cli.command("submit-batch")
+@click.option("--file", "jobs_file", required=True, type=click.File("r"),
+              help="JSON Lines file with one job per line (org_id, app_version_id, test_path, priority, target)")
+def submit_batch(jobs_file):
+    """Submit many test jobs from a JSON Lines file"""
+    submitted = 0
+    batch = []
+    
+    try:
+        for line_number, line in enumerate(jobs_file, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            
+            try:
+                batch.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                click.echo(click.style(f"✗ Invalid JSON on line {line_number}: {e}", fg="red"), err=True)
+                sys.exit(1)
+            
+            if len(batch) >= BATCH_SIZE:
+                submitted += post_job_batch(batch)
+                batch = []
+        
+        if batch:
+            submitted += post_job_batch(batch)
+        
+        click.echo(click.style(f"✓ Submitted {submitted} jobs successfully!", fg="green"))
+        
+    except httpx.TimeoutException:
+        click.echo(click.style("✗ Request timed out", fg="red"), err=True)
+        sys.exit(1)
+    except httpx.NetworkError:
+        click.echo(click.style(f"✗ Cannot connect to API server at {API_BASE_URL}", fg="red"), err=True)
+        sys.exit(1)
+
 @cli.command()
 @click.option("--job-id", required=True, help="Job ID to check")
 @click.option("--verbose", "-v", is_flag=True, help="Show detailed information")
 def status(job_id, verbose):
     """Check job status"""
     try:
-        response = requests.get(f"{API_BASE_URL}/jobs/{job_id}", timeout=TIMEOUT)
+        response = _client.get(f"/jobs/{job_id}")
         
         if response.status_code == 200:
             job = response.json()
             
-            status_color = {
-                "queued": "yellow",
-                "processing": "blue", 
-                "completed": "green",
-                "failed": "red"
-            }.get(job['status'], "white")
+            status_color = STATUS_COLORS.get(job['status'], "white")
             
             click.echo(f"Job ID: {click.style(job['job_id'], fg='blue')}")
             click.echo(f"Status: {click.style(job['status'].upper(), fg=status_color)}")
@@ -117,10 +185,10 @@ def status(job_id, verbose):
             click.echo(click.style(f"✗ Error getting job status: {error_detail}", fg="red"), err=True)
             sys.exit(1)
             
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         click.echo(click.style("✗ Request timed out", fg="red"), err=True)
         sys.exit(1)
-    except requests.exceptions.ConnectionError:
+    except httpx.NetworkError:
         click.echo(click.style(f"✗ Cannot connect to API server at {API_BASE_URL}", fg="red"), err=True)
         sys.exit(1)
     except Exception as e:
@@ -129,25 +197,39 @@ def status(job_id, verbose):
 
 @cli.command()
 @click.option("--org-id", help="Filter by organization ID")
-@click.option("--status", help="Filter by job status")
+@click.option("--status", type=click.Choice(list(STATUS_COLORS)), help="Filter by job status")
 @click.option("--app-version-id", help="Filter by app version ID")
-@click.option("--limit", default=20, help="Maximum number of jobs to show")
+@click.option("--limit", default=20, type=click.IntRange(min=1), help="Maximum number of jobs to show")
 def list(org_id, status, app_version_id, limit):
     """List jobs with optional filters"""
     try:
-        params = {"limit": limit}
+        params = {}
         if org_id:
             params["org_id"] = org_id
         if status:
             params["status"] = status
         if app_version_id:
             params["app_version_id"] = app_version_id
+        
+        # Follow the server's keyset cursor until `limit` jobs have been fetched
+        jobs = []
+        cursor = None
+        while len(jobs) < limit:
+            params["limit"] = min(limit - len(jobs), PAGE_SIZE)
+            if cursor:
+                params["cursor"] = cursor
+            
+            response = _client.get("/jobs", params=params)
+            if response.status_code != 200:
+                break
             
-        response = requests.get(f"{API_BASE_URL}/jobs", params=params, timeout=TIMEOUT)
+            jobs.extend(response.json())
+            total_count = response.headers.get("X-Total-Count")
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
         
         if response.status_code == 200:
-            jobs = response.json()
-            
             if not jobs:
                 click.echo("No jobs found")
                 return
@@ -156,50 +238,90 @@ def list(org_id, status, app_version_id, limit):
             click.echo("-" * 110)
             
             for job in jobs:
-                status_color = {
-                    "queued": "yellow",
-                    "processing": "blue",
-                    "completed": "green", 
-                    "failed": "red"
-                }.get(job['status'], "white")
-                
-                created_time = job['created_at'][:16].replace('T', ' ')
-                
-                status_formatted = click.style(job['status'].upper(), fg=status_color)
+                created_time = job['created_at'][:16].translate(ISO_T_TO_SPACE)
+                status_formatted = STATUS_STYLED.get(job['status']) or f"{job['status'].upper():<12}"
                 
                 click.echo(f"{job['job_id']:<36} "
-                          f"{status_formatted:<12} "
+                          f"{status_formatted} "
                           f"{job['org_id']:<15} "
                           f"{job['app_version_id']:<15} "
                           f"{job['target']:<12} "
                           f"{created_time}")
+            
+            if total_count:
+                click.echo(f"\nShowing {len(jobs)} of {total_count} jobs")
         else:
             error_detail = handle_api_error(response)
             click.echo(click.style(f"✗ Error listing jobs: {error_detail}", fg="red"), err=True)
             sys.exit(1)
             
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         click.echo(click.style("✗ Request timed out", fg="red"), err=True)
         sys.exit(1)
-    except requests.exceptions.ConnectionError:
+    except httpx.NetworkError:
         click.echo(click.style(f"✗ Cannot connect to API server at {API_BASE_URL}", fg="red"), err=True)
         sys.exit(1)
     except Exception as e:
         click.echo(click.style(f"✗ Unexpected error: {e}", fg="red"), err=True)
         sys.exit(1)
 
+def wait_for_terminal_event(job_id, start_time, timeout, bar):
+    """Block on the job's event stream until it completes or fails.
+    
+    Returns False when the stream is unavailable so the caller can fall back to polling.
+    """
+    try:
+        stream_timeout = httpx.Timeout(TIMEOUT, read=max(start_time + timeout - time.monotonic(), 0))
+        with _client.stream("GET", f"/jobs/{job_id}/events", timeout=stream_timeout) as response:
+            if response.status_code != 200:
+                return False
+            
+            for line in response.iter_lines():
+                elapsed = time.monotonic() - start_time
+                if elapsed >= timeout:
+                    return False
+                bar.update(int(elapsed) - bar.pos)
+                if not line.startswith("data:"):
+                    continue
+                
+                if json.loads(line[len("data:"):])["status"] in ("completed", "failed"):
+                    return True
+    except (httpx.HTTPError, ValueError, KeyError):
+        pass
+    
+    return False
+
 @cli.command()
 @click.option("--job-id", required=True, help="Job ID to wait for")
 @click.option("--timeout", default=300, help="Timeout in seconds")
-@click.option("--poll-interval", default=5, help="Polling interval in seconds")
-def wait(job_id, timeout, poll_interval):
+@click.option("--poll-interval", default=5.0, help="Initial polling interval in seconds")
+@click.option("--max-poll-interval", default=30.0, help="Maximum polling interval in seconds")
+def wait(job_id, timeout, poll_interval, max_poll_interval):
     """Wait for job completion"""
-    start_time = time.time()
+    start_time = time.monotonic()
+    current_interval = max(poll_interval, MIN_POLL_INTERVAL)
+    max_poll_interval = max(max_poll_interval, current_interval)
+    
+    def backoff_sleep():
+        # Back off exponentially so long-running jobs are polled less often
+        nonlocal current_interval
+        remaining = timeout - (time.monotonic() - start_time)
+        time.sleep(max(min(current_interval, remaining), 0))
+        current_interval = min(current_interval * POLL_BACKOFF_FACTOR, max_poll_interval)
     
     with click.progressbar(length=timeout, label="Waiting for job completion") as bar:
-        while time.time() - start_time < timeout:
+        # Push-based wait; the polling loop below then reports the final state
+        # (or takes over entirely if the server has no event stream)
+        try:
+            wait_for_terminal_event(job_id, start_time, timeout, bar)
+        except KeyboardInterrupt:
+            bar.finish()
+            click.echo(f"\n✗ Wait cancelled by user")
+            sys.exit(1)
+        
+        while time.monotonic() - start_time < timeout:
             try:
-                response = requests.get(f"{API_BASE_URL}/jobs/{job_id}", timeout=TIMEOUT)
+                response = _client.get(f"/jobs/{job_id}")
                 
                 if response.status_code == 200:
                     job = response.json()
@@ -219,7 +341,7 @@ def wait(job_id, timeout, poll_interval):
                         click.echo(f"\n✗ Job {job_id} failed: {error_msg}", err=True)
                         sys.exit(1)
                     
-                    elapsed = int(time.time() - start_time)
+                    elapsed = int(time.monotonic() - start_time)
                     bar.update(elapsed)
                     
                 elif response.status_code == 404:
@@ -230,13 +352,13 @@ def wait(job_id, timeout, poll_interval):
                     error_detail = handle_api_error(response)
                     click.echo(f"\n✗ Error checking job status: {error_detail}", err=True)
                 
-                time.sleep(poll_interval)
+                backoff_sleep()
                 
-            except requests.exceptions.Timeout:
+            except httpx.TimeoutException:
                 continue
-            except requests.exceptions.ConnectionError:
+            except httpx.NetworkError:
                 click.echo(f"\n✗ Connection lost to API server", err=True)
-                time.sleep(poll_interval)
+                backoff_sleep()
             except KeyboardInterrupt:
                 bar.finish()
                 click.echo(f"\n✗ Wait cancelled by user")
@@ -251,7 +373,7 @@ def wait(job_id, timeout, poll_interval):
 def retry(job_id):
     """Retry a failed job"""
     try:
-        response = requests.get(f"{API_BASE_URL}/jobs/{job_id}/retry", timeout=TIMEOUT)
+        response = _client.get(f"/jobs/{job_id}/retry")
         
         if response.status_code == 200:
             result = response.json()
@@ -263,7 +385,7 @@ def retry(job_id):
             click.echo(click.style(f"✗ Error retrying job: {error_detail}", fg="red"), err=True)
             sys.exit(1)
             
-    except requests.exceptions.ConnectionError:
+    except httpx.NetworkError:
         click.echo(click.style(f"✗ Cannot connect to API server at {API_BASE_URL}", fg="red"), err=True)
         sys.exit(1)
     except Exception as e:
@@ -275,7 +397,7 @@ def retry(job_id):
 def cancel(job_id):
     """Cancel a queued or processing job"""
     try:
-        response = requests.delete(f"{API_BASE_URL}/jobs/{job_id}", timeout=TIMEOUT)
+        response = _client.delete(f"/jobs/{job_id}")
         
         if response.status_code == 200:
             result = response.json()
@@ -287,7 +409,7 @@ def cancel(job_id):
             click.echo(click.style(f"✗ Error cancelling job: {error_detail}", fg="red"), err=True)
             sys.exit(1)
             
-    except requests.exceptions.ConnectionError:
+    except httpx.NetworkError:
         click.echo(click.style(f"✗ Cannot connect to API server at {API_BASE_URL}", fg="red"), err=True)
         sys.exit(1)
     except Exception as e:
@@ -298,7 +420,7 @@ def cancel(job_id):
 def metrics():
     """Show system metrics"""
     try:
-        response = requests.get(f"{API_BASE_URL}/metrics", timeout=TIMEOUT)
+        response = _client.get("/metrics")
         
         if response.status_code == 200:
             metrics = response.json()
@@ -316,7 +438,7 @@ def metrics():
             click.echo(click.style(f"✗ Error getting metrics: {error_detail}", fg="red"), err=True)
             sys.exit(1)
             
-    except requests.exceptions.ConnectionError:
+    except httpx.NetworkError:
         click.echo(click.style(f"✗ Cannot connect to API server at {API_BASE_URL}", fg="red"), err=True)
         sys.exit(1)
     except Exception as e:
@@ -1,54 +1,392 @@
-import json
+import os
+import orjson
 import uuid
+import hashlib
+import time
 from datetime import datetime, timezone
-from .database import redis_client
+from typing import Optional
+from .database import redis_client, async_redis_client
 from .models import Job, JobStatus
 
+def build_job_payload(job_data: dict) -> dict:
+    job_id = job_data.get("id", str(uuid.uuid4()))
+    return {
+        "id": job_id,
+        **job_data,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+
+# Per-job status keys; terminal statuses expire so Redis memory stays bounded
+STATUS_TTL = int(os.getenv("JOB_STATUS_TTL", "86400"))
+TERMINAL_STATUSES = (JobStatus.COMPLETED.value, JobStatus.FAILED.value)
+
+# Bounded queue: submissions beyond this length are rejected (0 disables the bound)
+MAX_QUEUE_SIZE = int(os.getenv("MAX_QUEUE_SIZE", "10000"))
+# Window in which identical submissions collapse onto the first job
+DEDUP_TTL = int(os.getenv("JOB_DEDUP_TTL", "60"))
+# Queued jobs are split over this many sorted sets by app version, so a worker serving a
+# subset of shards keeps each app version (and its warm drivers and uploads) to itself
+QUEUE_SHARDS = int(os.getenv("QUEUE_SHARDS", "1"))
+
+class QueueFullError(Exception):
+    """Raised when the job queue is at MAX_QUEUE_SIZE"""
+    pass
+
+# Atomically swap a job's status, move it between the per-status counters,
+# drop the cached GET /jobs/{id} response and announce the change to any
+# event stream subscribers
+SET_STATUS_LUA = """
+local function set_status(key, status, prefix, ttl, job_id)
+    local old = redis.call('GET', key)
+    if old ~= status then
+        if old then
+            redis.call('DECR', prefix .. old)
+        end
+        redis.call('INCR', prefix .. status)
+        redis.call('DEL', 'job:' .. job_id)
+        redis.call('PUBLISH', 'jobs:events:' .. job_id, '{"job_id":"' .. job_id .. '","status":"' .. status .. '"}')
+    end
+    if tonumber(ttl) > 0 then
+        redis.call('SET', key, status, 'EX', ttl)
+    else
+        redis.call('SET', key, status)
+    end
+    return old
+end
+"""
+
+SET_STATUS_SCRIPT = SET_STATUS_LUA + """
+return set_status(KEYS[1], ARGV[1], ARGV[2], ARGV[3], ARGV[4])
+"""
+
+# All-or-nothing enqueue of N jobs, refused when it would overflow the queue.
+# KEYS: payload hash, N status keys, N app version index keys, N queue shard keys, every queue shard key
+# ARGV: max queue size, status counter prefix, N, then (job id, score, payload) per job
+ENQUEUE_SCRIPT = SET_STATUS_LUA + """
+local n = tonumber(ARGV[3])
+local max_size = tonumber(ARGV[1])
+if max_size > 0 then
+    local size = 0
+    for i = 2 + 3 * n, #KEYS do
+        size = size + redis.call('ZCARD', KEYS[i])
+    end
+    if size + n > max_size then
+        return 0
+    end
+end
+for i = 1, n do
+    local job_id = ARGV[3 * i + 1]
+    local score = ARGV[3 * i + 2]
+    local payload = ARGV[3 * i + 3]
+    redis.call('ZADD', KEYS[1 + 2 * n + i], score, job_id)
+    redis.call('HSET', KEYS[1], job_id, payload)
+    redis.call('SADD', KEYS[1 + n + i], job_id)
+    set_status(KEYS[1 + i], 'queued', ARGV[2], 0, job_id)
+end
+return n
+"""
+
+# Promote retries whose delay has passed, then pop up to N of the best-scored job IDs across
+# the given shards and take their payloads, all in one round-trip
+# KEYS: payload hash, retry score hash, queue shard keys, then each shard's delayed key in the same order
+# ARGV: count, current time in ms, then IDs already popped (by BZPOPMIN) to include
+DEQUEUE_SCRIPT = """
+local count = tonumber(ARGV[1])
+local shards = (#KEYS - 2) / 2
+for k = 3, 2 + shards do
+    local due = redis.call('ZRANGEBYSCORE', KEYS[k + shards], '-inf', ARGV[2], 'LIMIT', 0, count)
+    if #due > 0 then
+        local scores = redis.call('HMGET', KEYS[2], unpack(due))
+        for i, job_id in ipairs(due) do
+            if scores[i] then
+                redis.call('ZADD', KEYS[k], scores[i], job_id)
+            end
+        end
+        redis.call('ZREM', KEYS[k + shards], unpack(due))
+        redis.call('HDEL', KEYS[2], unpack(due))
+    end
+end
+local job_ids = {}
+for i = 3, #ARGV do
+    job_ids[#job_ids + 1] = ARGV[i]
+end
+for k = 3, 2 + shards do
+    if #job_ids >= count then
+        break
+    end
+    local popped = redis.call('ZPOPMIN', KEYS[k], count - #job_ids)
+    for i = 1, #popped, 2 do
+        job_ids[#job_ids + 1] = popped[i]
+    end
+end
+if #job_ids == 0 then
+    return {}
+end
+local payloads = redis.call('HMGET', KEYS[1], unpack(job_ids))
+redis.call('HDEL', KEYS[1], unpack(job_ids))
+return payloads
+"""
+
+# Jobs popped per dequeue round-trip
+DEQUEUE_BATCH = int(os.getenv("DEQUEUE_BATCH", "128"))
+
+def queue_shard(app_version_id: str) -> int:
+    # The first 32 bits of an MD5 rather than hash(), which is salted per process; Postgres can
+    # compute the same value (queries.app_version_shard) to claim only a worker's own shards
+    return int(hashlib.md5(app_version_id.encode()).hexdigest()[:8], 16) % QUEUE_SHARDS
+
+def queue_key(shard: int) -> str:
+    # Shard 0 keeps the unsharded key, so QUEUE_SHARDS=1 behaves exactly as before
+    return f"{JobQueue.QUEUE_KEY}:{shard}" if shard else JobQueue.QUEUE_KEY
+
+def delayed_key(queue_key: str) -> str:
+    # Jobs waiting out a retry backoff, scored by the time (ms) they become due
+    return f"{queue_key}:delayed"
+
+def app_version_key(app_version_id: str) -> str:
+    return f"appver:{app_version_id}"
+
+def queue_score(job_payload: dict, enqueued_at: Optional[float] = None) -> int:
+    # Lower priority value first, then FIFO by enqueue time; stays exact within a double
+    if enqueued_at is None:
+        enqueued_at = time.time()
+    return int(job_payload.get("priority", 5)) * 10**13 + int(enqueued_at * 1000)
+
+def dedup_key(org_id: str, app_version_id: str, test_path: str, target: str) -> str:
+    digest = hashlib.sha1(f"{org_id}|{app_version_id}|{test_path}|{target}".encode()).hexdigest()
+    return f"job_dedup:{digest}"
+
+def job_cache_key(job_id: str) -> str:
+    return f"job:{job_id}"
+
+def events_channel(job_id: str) -> str:
+    return f"jobs:events:{job_id}"
+
+def status_script_args(job_id: str, status: JobStatus) -> list:
+    ttl = STATUS_TTL if status.value in TERMINAL_STATUSES else 0
+    return [status.value, JobQueue.STATUS_COUNTS_PREFIX, ttl, job_id]
+
+def enqueue_script_args(jobs_data: list) -> tuple:
+    payloads = [build_job_payload(job_data) for job_data in jobs_data]
+    job_ids = [payload["id"] for payload in payloads]
+    
+    keys = [JobQueue.PAYLOAD_KEY]
+    keys += [f"{JobQueue.STATUS_KEY}:{job_id}" for job_id in job_ids]
+    keys += [app_version_key(payload["app_version_id"]) for payload in payloads]
+    keys += [queue_key(queue_shard(payload["app_version_id"])) for payload in payloads]
+    keys += QUEUE_KEYS
+    
+    args = [MAX_QUEUE_SIZE, JobQueue.STATUS_COUNTS_PREFIX, len(payloads)]
+    for payload in payloads:
+        # The payload keeps its score so a retry goes back to the same place in the queue
+        payload["score"] = queue_score(payload)
+        args += [payload["id"], payload["score"], orjson.dumps(payload)]
+    
+    return keys, args, job_ids
+
 class JobQueue:
-    QUEUE_KEY = "job_queue"
+    # Sorted sets of job IDs scored by (priority, enqueue time), one per queue shard; payloads live in PAYLOAD_KEY
+    QUEUE_KEY = "job_queue:priority"
     STATUS_KEY = "job_status"
+    STATUS_COUNTS_PREFIX = "job_status_counts:"
+    PAYLOAD_KEY = "jobs:payload"
+    RETRY_SCORE_KEY = "jobs:retry_score"
+    # Finished jobs whose results a worker holds for its next batched write, scored by when they finished
+    FINISHING_KEY = "jobs:finishing"
+    
+    def __init__(self, shards: Optional[list] = None):
+        """shards limits dequeueing to those queue shards; enqueueing always routes by app version"""
+        self.queue_keys = [queue_key(shard) for shard in shards] if shards else QUEUE_KEYS
+        self.dequeue_keys = [self.PAYLOAD_KEY, self.RETRY_SCORE_KEY, *self.queue_keys, *map(delayed_key, self.queue_keys)]
+        self.set_status_script = redis_client.register_script(SET_STATUS_SCRIPT)
+        self.enqueue_script = redis_client.register_script(ENQUEUE_SCRIPT)
+        self.dequeue_script = redis_client.register_script(DEQUEUE_SCRIPT)
+    
+    def status_key(self, job_id: str) -> str:
+        return f"{self.STATUS_KEY}:{job_id}"
     
     def enqueue_job(self, job_data: dict) -> str:
-        job_id = job_data.get("id", str(uuid.uuid4()))
-        job_payload = {
-            "id": job_id,
-            **job_data,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
+        # Queue push, status and per-app-version index are written atomically
+        keys, args, job_ids = enqueue_script_args([job_data])
+        if not self.enqueue_script(keys=keys, args=args):
+            raise QueueFullError(f"Job queue is full ({MAX_QUEUE_SIZE} jobs)")
         
-        redis_client.lpush(self.QUEUE_KEY, json.dumps(job_payload))
-        redis_client.hset(self.STATUS_KEY, job_id, JobStatus.QUEUED.value)
-        
-        return job_id
+        return job_ids[0]
     
     def dequeue_job(self):
-        job_json = redis_client.rpop(self.QUEUE_KEY)
-        if job_json:
-            return json.loads(job_json)
-        return None
+        jobs = self.dequeue_batch(1)
+        return jobs[0] if jobs else None
+    
+    def dequeue_batch(self, count: int = DEQUEUE_BATCH) -> list:
+        """Pop up to count jobs in priority order"""
+        return self._take_jobs(count, [])
+    
+    def dequeue_batch_blocking(self, count: int = DEQUEUE_BATCH, timeout: int = 5) -> list:
+        """Like dequeue_batch, but wait up to timeout seconds for a first job instead of polling an empty queue.
+
+        Delayed retries are promoted by the dequeue that follows, so one falling due while
+        this waits starts at most timeout seconds late.
+        """
+        popped = redis_client.bzpopmin(self.queue_keys, timeout=timeout)
+        if not popped:
+            return []
+        
+        return self._take_jobs(count, [popped[1]])
+    
+    def _take_jobs(self, count: int, popped_ids: list) -> list:
+        now_ms = int(time.time() * 1000)
+        payloads = self.dequeue_script(keys=self.dequeue_keys, args=[count, now_ms, *popped_ids])
+        jobs = [orjson.loads(job_json) for job_json in payloads if job_json]
+        
+        if jobs:
+            with redis_client.pipeline(transaction=False) as pipe:
+                for job in jobs:
+                    pipe.srem(app_version_key(job["app_version_id"]), job["id"])
+                pipe.execute()
+        
+        return jobs
+    
+    def retry_later(self, job: dict, delay: float):
+        """Park a job for delay seconds instead of holding a worker thread; a later dequeue puts it back in its queue.
+
+        It returns at its original enqueue score, so it keeps its FIFO place within its priority.
+        """
+        self.retry_jobs_later([job], delay)
+    
+    def retry_jobs_later(self, jobs: list, delay: float):
+        """retry_later for several jobs in one round-trip"""
+        due_ms = int((time.time() + delay) * 1000)
+        with redis_client.pipeline(transaction=True) as pipe:
+            for job in jobs:
+                key = queue_key(queue_shard(job["app_version_id"]))
+                pipe.hset(self.PAYLOAD_KEY, job["id"], orjson.dumps(job))
+                pipe.hset(self.RETRY_SCORE_KEY, job["id"], job.get("score") or queue_score(job))
+                pipe.zadd(delayed_key(key), {job["id"]: due_ms})
+            pipe.execute()
+    
+    def remove_jobs(self, jobs: list):
+        """Drop jobs claimed outside Redis from the queue so no worker pops them again"""
+        with redis_client.pipeline(transaction=True) as pipe:
+            for job in jobs:
+                pipe.zrem(queue_key(queue_shard(job["app_version_id"])), job["id"])
+                pipe.hdel(self.PAYLOAD_KEY, job["id"])
+                pipe.srem(app_version_key(job["app_version_id"]), job["id"])
+            pipe.execute()
+    
+    def mark_finishing(self, job_ids: list):
+        """Flag jobs whose results are buffered for a batched write, so the stale sweep leaves them alone"""
+        now = time.time()
+        redis_client.zadd(self.FINISHING_KEY, {job_id: now for job_id in job_ids})
+    
+    def clear_finishing(self, job_ids: list):
+        redis_client.zrem(self.FINISHING_KEY, *job_ids)
+    
+    def get_finishing(self, max_age: float) -> list:
+        """IDs flagged by mark_finishing; flags older than max_age are from a worker that died first, and are dropped"""
+        with redis_client.pipeline(transaction=True) as pipe:
+            pipe.zremrangebyscore(self.FINISHING_KEY, "-inf", time.time() - max_age)
+            pipe.zrange(self.FINISHING_KEY, 0, -1)
+            return pipe.execute()[1]
     
     def update_job_status(self, job_id: str, status: JobStatus):
-        redis_client.hset(self.STATUS_KEY, job_id, status.value)
+        self.set_status_script(keys=[self.status_key(job_id)], args=status_script_args(job_id, status))
+    
+    def update_job_statuses(self, statuses: list):
+        """Apply several (job_id, status) updates in one round-trip"""
+        if not statuses:
+            return
+        
+        with redis_client.pipeline(transaction=False) as pipe:
+            for job_id, status in statuses:
+                self.set_status_script(keys=[self.status_key(job_id)], args=status_script_args(job_id, status), client=pipe)
+            pipe.execute()
     
     def get_job_status(self, job_id: str) -> str:
-        return redis_client.hget(self.STATUS_KEY, job_id)
+        return redis_client.get(self.status_key(job_id))
     
     def get_jobs_by_app_version(self, app_version_id: str) -> list:
-        jobs = []
-        queue_length = redis_client.llen(self.QUEUE_KEY)
+        job_ids = redis_client.smembers(app_version_key(app_version_id))
+        if not job_ids:
+            return []
         
-        for i in range(queue_length):
-            job_json = redis_client.lindex(self.QUEUE_KEY, i)
-            if job_json:
-                job = json.loads(job_json)
-                if job.get("app_version_id") == app_version_id:
-                    jobs.append(job)
-        
-        return jobs
+        payloads = redis_client.hmget(self.PAYLOAD_KEY, list(job_ids))
+        jobs = [orjson.loads(job_json) for job_json in payloads if job_json]
+        return sorted(jobs, key=lambda job: (job.get("priority", 5), job["created_at"]))
     
     def get_queue_size(self) -> int:
-        return redis_client.llen(self.QUEUE_KEY)
+        with redis_client.pipeline(transaction=False) as pipe:
+            for key in QUEUE_KEYS:
+                pipe.zcard(key)
+            return sum(pipe.execute())
     
     def get_processing_jobs_count(self) -> int:
-        processing_jobs = redis_client.hgetall(self.STATUS_KEY)
-        return sum(1 for status in processing_jobs.values() if status == JobStatus.PROCESSING.value)
+        return int(redis_client.get(f"{self.STATUS_COUNTS_PREFIX}{JobStatus.PROCESSING.value}") or 0)
+
+# Every shard's key, for enqueue bounds and queue size
+QUEUE_KEYS = [queue_key(shard) for shard in range(QUEUE_SHARDS)]
+
+class AsyncJobQueue:
+    """Non-blocking counterpart of JobQueue for the API event loop"""
+    QUEUE_KEY = JobQueue.QUEUE_KEY
+    STATUS_KEY = JobQueue.STATUS_KEY
+    PAYLOAD_KEY = JobQueue.PAYLOAD_KEY
+    status_key = JobQueue.status_key
+    
+    def __init__(self):
+        self.set_status_script = async_redis_client.register_script(SET_STATUS_SCRIPT)
+        self.enqueue_script = async_redis_client.register_script(ENQUEUE_SCRIPT)
+    
+    async def enqueue_job(self, job_data: dict) -> str:
+        job_ids = await self.enqueue_jobs([job_data])
+        return job_ids[0]
+    
+    async def enqueue_jobs(self, jobs_data: list) -> list:
+        """Enqueue several jobs atomically in a single round-trip"""
+        keys, args, job_ids = enqueue_script_args(jobs_data)
+        if not await self.enqueue_script(keys=keys, args=args):
+            raise QueueFullError(f"Job queue is full ({MAX_QUEUE_SIZE} jobs)")
+        
+        return job_ids
+    
+    async def claim_submission(self, org_id: str, app_version_id: str, test_path: str, target: str, job_id: str) -> Optional[str]:
+        """Single-flight guard: return the in-flight job ID for an identical submission, or None if claimed"""
+        key = dedup_key(org_id, app_version_id, test_path, target)
+        if await async_redis_client.set(key, job_id, nx=True, ex=DEDUP_TTL):
+            return None
+        
+        existing_job_id = await async_redis_client.get(key)
+        if existing_job_id and await self.get_job_status(existing_job_id) not in TERMINAL_STATUSES:
+            return existing_job_id
+        
+        # The earlier job already finished, so this is a fresh submission
+        await async_redis_client.set(key, job_id, ex=DEDUP_TTL)
+        return None
+    
+    async def release_submission(self, org_id: str, app_version_id: str, test_path: str, target: str):
+        await async_redis_client.delete(dedup_key(org_id, app_version_id, test_path, target))
+    
+    async def update_job_status(self, job_id: str, status: JobStatus):
+        await self.set_status_script(keys=[self.status_key(job_id)], args=status_script_args(job_id, status))
+    
+    async def get_job_status(self, job_id: str) -> str:
+        return await async_redis_client.get(self.status_key(job_id))
+    
+    async def get_queue_size(self) -> int:
+        async with async_redis_client.pipeline(transaction=False) as pipe:
+            for key in QUEUE_KEYS:
+                pipe.zcard(key)
+            return sum(await pipe.execute())
+    
+    async def check_not_full(self):
+        """Raise QueueFullError up front, before work that a rejected enqueue would have to undo"""
+        if MAX_QUEUE_SIZE > 0 and await self.get_queue_size() >= MAX_QUEUE_SIZE:
+            raise QueueFullError(f"Job queue is full ({MAX_QUEUE_SIZE} jobs)")
+    
+    async def find_unqueued(self, job_ids: list) -> list:
+        """Return the IDs that never reached Redis, i.e. have no status key"""
+        async with async_redis_client.pipeline(transaction=False) as pipe:
+            for job_id in job_ids:
+                pipe.exists(self.status_key(job_id))
+            found = await pipe.execute()
+        
+        return [job_id for job_id, exists in zip(job_ids, found) if not exists]
@@ -1,31 +1,56 @@
-from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from .database import get_db, create_tables
-from .models import Job, JobStatus
-from .schemas import JobCreate, JobResponse
-from .job_queue import JobQueue
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import select, func, insert, update, delete, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
+from .database import (
+    get_async_db, create_tables, async_engine, async_redis_client, async_pubsub_client, AsyncSessionLocal,
+    EVENTS_MAX_STREAMS
+)
+from .models import Job, JobStatus, jobs_table
+from .schemas import JobCreate
+from .job_queue import AsyncJobQueue, QueueFullError, events_channel, job_cache_key
 import uuid
+import asyncio
+import anyio
+import base64
+import orjson
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from typing import Optional, List
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import os
 
-# Configure production logging
+# Configure production logging; records are handed to a queue and written by a
+# background listener thread so request handlers never block on log I/O
+log_queue = queue.Queue(-1)
+log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+log_stream_handler = logging.StreamHandler()
+log_stream_handler.setFormatter(log_formatter)
+# Processes can't safely rotate a shared file, so with several API workers each writes its own
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+log_file_name = f"qgjob-{os.getpid()}.log" if WEB_CONCURRENCY > 1 else "qgjob.log"
+log_file_handler = RotatingFileHandler(log_file_name, maxBytes=50_000_000, backupCount=5)
+log_file_handler.setFormatter(log_formatter)
+log_listener = QueueListener(log_queue, log_stream_handler, log_file_handler, respect_handler_level=True)
+
+# force=True replaces the default handler installed by module-level logging calls during import;
+# the queue handler only passes the message through, the listener's handlers do the formatting
 logging.basicConfig(
     level=os.getenv("LOG_LEVEL", "INFO"),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('qgjob.log')
-    ]
+    format='%(message)s',
+    handlers=[QueueHandler(log_queue)],
+    force=True
 )
 logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="QualGent Job Orchestrator",
     description="Production-ready job orchestration system for AppWright tests",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 app.add_middleware(
@@ -34,12 +59,101 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Next-Cursor"],
+)
+
+job_queue = AsyncJobQueue()
+# Open event streams in this process, bounded by the pubsub pool size
+event_streams = asyncio.Semaphore(EVENTS_MAX_STREAMS)
+
+METRICS_CACHE_KEY = "metrics:summary"
+METRICS_CACHE_TTL = int(os.getenv("METRICS_CACHE_TTL", "3"))
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "100"))
+JOB_COUNT_CACHE_TTL = int(os.getenv("JOB_COUNT_CACHE_TTL", "5"))
+QUEUE_FULL_RETRY_AFTER = os.getenv("QUEUE_FULL_RETRY_AFTER", "30")
+EVENTS_KEEPALIVE_INTERVAL = float(os.getenv("EVENTS_KEEPALIVE_INTERVAL", "15"))
+EVENTS_RETRY_AFTER = os.getenv("EVENTS_RETRY_AFTER", "5")
+TERMINAL_STATUSES = (JobStatus.COMPLETED.value, JobStatus.FAILED.value)
+JOB_CACHE_TTL = int(os.getenv("JOB_CACHE_TTL", "5"))
+TERMINAL_JOB_CACHE_TTL = int(os.getenv("TERMINAL_JOB_CACHE_TTL", "300"))
+ENQUEUE_SWEEP_INTERVAL = float(os.getenv("ENQUEUE_SWEEP_INTERVAL", "30"))
+ENQUEUE_SWEEP_BATCH = int(os.getenv("ENQUEUE_SWEEP_BATCH", "500"))
+LIST_JOB_COLUMNS = (
+    Job.id.label("job_id"), Job.status, Job.org_id, Job.app_version_id, Job.test_path,
+    Job.priority, Job.target, Job.created_at, Job.updated_at
 )
 
-job_queue = JobQueue()
+def queue_full_exception(e: QueueFullError) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": QUEUE_FULL_RETRY_AFTER})
+
+def encode_cursor(created_at: datetime, job_id: str) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps([created_at.isoformat(), job_id])).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    created_at, job_id = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return datetime.fromisoformat(created_at), job_id
+
+async def job_exists(job_id: str, db: AsyncSession) -> bool:
+    """Tells a missing job apart from one a conditional UPDATE skipped because of its status"""
+    return (await db.execute(select(Job.id).where(Job.id == job_id))).first() is not None
+
+def job_payload(job) -> dict:
+    return {
+        "id": job.id,
+        "org_id": job.org_id,
+        "app_version_id": job.app_version_id,
+        "test_path": job.test_path,
+        "priority": job.priority,
+        "target": job.target.value
+    }
+
+async def enqueue_submitted_job(payload: dict):
+    """Runs after the submit response is sent; a queue that filled since submit_job's check fails the job as a last resort"""
+    try:
+        await job_queue.enqueue_job(payload)
+    except QueueFullError as e:
+        logger.warning("Rejected job %s: %s", payload["id"], e)
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Job)
+                .where(Job.id == payload["id"], Job.status == JobStatus.QUEUED)
+                .values(status=JobStatus.FAILED, error_message=str(e), updated_at=func.now())
+            )
+            await db.commit()
+        await job_queue.update_job_status(payload["id"], JobStatus.FAILED)
+        await job_queue.release_submission(payload["org_id"], payload["app_version_id"], payload["test_path"], payload["target"])
+    except Exception as e:
+        # Left QUEUED in the database, so the sweeper picks it up
+        logger.error("Error enqueuing job %s: %s", payload["id"], e)
+
+async def sweep_unqueued_jobs():
+    """Safety net: re-enqueue QUEUED rows that never reached Redis, e.g. the process died after commit"""
+    while True:
+        await asyncio.sleep(ENQUEUE_SWEEP_INTERVAL)
+        try:
+            async with AsyncSessionLocal() as db:
+                cutoff = func.now() - timedelta(seconds=ENQUEUE_SWEEP_INTERVAL)
+                jobs = (await db.execute(
+                    select(Job.id, Job.org_id, Job.app_version_id, Job.test_path, Job.priority, Job.target)
+                    .where(Job.status == JobStatus.QUEUED, Job.updated_at < cutoff)
+                    .order_by(Job.updated_at)
+                    .limit(ENQUEUE_SWEEP_BATCH)
+                )).all()
+            
+            if not jobs:
+                continue
+            
+            unqueued = set(await job_queue.find_unqueued([job.id for job in jobs]))
+            for job in jobs:
+                if job.id in unqueued:
+                    logger.warning("Re-enqueuing job %s missing from Redis", job.id)
+                    await enqueue_submitted_job(job_payload(job))
+        except Exception as e:
+            logger.error("Enqueue sweep failed: %s", e)
 
 @app.on_event("startup")
 async def startup_event():
+    log_listener.start()
     logger.info("Starting QualGent Job Orchestrator in production mode")
 
     # Validate required environment variables
@@ -61,48 +175,68 @@ async def startup_event():
         logger.error("Please configure all required environment variables before starting the application")
         raise RuntimeError(error_msg)
 
-    # Create database tables
+    # Create database tables; every process does this, so a plain `uvicorn qgjob.main:app` also
+    # starts with a schema, and create_tables() makes processes starting together take turns
     try:
-        create_tables()
+        await asyncio.to_thread(create_tables)
         logger.info("Database initialization completed successfully")
     except Exception as e:
-        logger.error(f"Failed to initialize database: {e}")
+        logger.error("Failed to initialize database: %s", e)
         raise
 
+    app.state.sweeper = asyncio.create_task(sweep_unqueued_jobs())
+
     logger.info("QualGent Job Orchestrator started successfully")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("QualGent Job Orchestrator shutting down")
+    app.state.sweeper.cancel()
+    await async_redis_client.aclose()
+    await async_pubsub_client.aclose()
+    await async_engine.dispose()
+    log_listener.stop()
 
 @app.post("/jobs", response_model=dict)
-async def submit_job(job: JobCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def submit_job(job: JobCreate, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db)):
+    claimed = False
     try:
         job_id = str(uuid.uuid4())
         
-        db_job = Job(
-            id=job_id,
-            org_id=job.org_id,
-            app_version_id=job.app_version_id,
-            test_path=job.test_path,
-            priority=job.priority,
-            target=job.target,
-            status=JobStatus.QUEUED
-        )
+        # The enqueue happens after the response, so backpressure has to be applied here
+        try:
+            await job_queue.check_not_full()
+        except QueueFullError as e:
+            logger.warning("Rejected job submission: %s", e)
+            raise queue_full_exception(e)
         
-        db.add(db_job)
-        db.commit()
+        # Single-flight: an identical submission still in its dedup window maps to the first job
+        existing_job_id = await job_queue.claim_submission(job.org_id, job.app_version_id, job.test_path, job.target.value, job_id)
+        if existing_job_id:
+            return {
+                "job_id": existing_job_id,
+                "status": await job_queue.get_job_status(existing_job_id) or "queued",
+                "message": "Identical job already submitted"
+            }
+        claimed = True
         
-        job_queue.enqueue_job({
+        job_data = {
             "id": job_id,
             "org_id": job.org_id,
             "app_version_id": job.app_version_id,
             "test_path": job.test_path,
             "priority": job.priority,
-            "target": job.target.value
-        })
+            "target": job.target
+        }
+        
+        # Core INSERT: no identity map or flush bookkeeping for a row we never read back
+        await db.execute(insert(jobs_table).values(**job_data))
+        await db.commit()
         
-        logger.info(f"Job {job_id} submitted by org {job.org_id} for app {job.app_version_id}")
+        # Enqueue after the response goes out so submission latency doesn't include the Redis round-trip
+        background_tasks.add_task(enqueue_submitted_job, {**job_data, "target": job.target.value})
+        
+        logger.info("Job %s submitted by org %s for app %s", job_id, job.org_id, job.app_version_id)
         
         return {
             "job_id": job_id,
@@ -110,115 +244,250 @@ async def submit_job(job: JobCreate, background_tasks: BackgroundTasks, db: Sess
             "message": "Job submitted successfully"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error submitting job: {str(e)}")
+        logger.error("Error submitting job: %s", e)
+        # The row was never committed, so identical resubmits must not be pointed at this job ID
+        if claimed:
+            try:
+                await job_queue.release_submission(job.org_id, job.app_version_id, job.test_path, job.target.value)
+            except Exception as release_error:
+                logger.error("Error releasing submission for job %s: %s", job_id, release_error)
         raise HTTPException(status_code=500, detail=f"Failed to submit job: {str(e)}")
 
-@app.get("/jobs/{job_id}", response_model=dict)
-async def get_job_status(job_id: str, db: Session = Depends(get_db)):
+@app.post("/jobs/batch", response_model=List[dict])
+async def submit_jobs_batch(jobs: List[JobCreate], db: AsyncSession = Depends(get_async_db)):
+    if not jobs:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one job")
+    if len(jobs) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch size exceeds maximum of {MAX_BATCH_SIZE} jobs")
+    
     try:
-        job = db.query(Job).filter(Job.id == job_id).first()
-        if not job:
-            raise HTTPException(status_code=404, detail="Job not found")
+        jobs_data = [
+            {
+                "id": str(uuid.uuid4()),
+                "org_id": job.org_id,
+                "app_version_id": job.app_version_id,
+                "test_path": job.test_path,
+                "priority": job.priority,
+                "target": job.target
+            }
+            for job in jobs
+        ]
         
-        response = {
-            "job_id": job.id,
-            "status": job.status.value,
-            "org_id": job.org_id,
-            "app_version_id": job.app_version_id,
-            "test_path": job.test_path,
-            "priority": job.priority,
-            "target": job.target.value,
-            "created_at": job.created_at.isoformat(),
-            "updated_at": job.updated_at.isoformat()
-        }
+        # One multi-row INSERT for the whole batch
+        await db.execute(insert(jobs_table), jobs_data)
+        await db.commit()
+        
+        try:
+            job_ids = await job_queue.enqueue_jobs([
+                {**job_data, "target": job_data["target"].value} for job_data in jobs_data
+            ])
+        except QueueFullError as e:
+            await db.execute(delete(Job).where(Job.id.in_([job_data["id"] for job_data in jobs_data])))
+            await db.commit()
+            logger.warning("Rejected batch of %s jobs: %s", len(jobs_data), e)
+            raise queue_full_exception(e)
         
-        if job.result:
-            import json
-            response["result"] = json.loads(job.result)
+        logger.info("Batch of %s jobs submitted", len(job_ids))
         
-        if job.error_message:
-            response["error_message"] = job.error_message
+        return [{"job_id": job_id, "status": "queued"} for job_id in job_ids]
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error submitting job batch: %s", e)
+        raise HTTPException(status_code=500, detail=f"Failed to submit job batch: {str(e)}")
+
+async def get_job_cached(job_id: str, db: AsyncSession) -> Optional[dict]:
+    """Read-through cache for job details; status changes invalidate the entry in Redis"""
+    cached = await async_redis_client.get(job_cache_key(job_id))
+    if cached:
+        return orjson.loads(cached)
+    
+    # The detail view is the one place that needs the deferred result columns; load them up front
+    # since lazy loads aren't available on an AsyncSession
+    job = (await db.execute(
+        select(Job).options(undefer(Job.result), undefer(Job.error_message)).where(Job.id == job_id)
+    )).scalar_one_or_none()
+    if not job:
+        return None
+    
+    response = {
+        "job_id": job.id,
+        "status": job.status.value,
+        "org_id": job.org_id,
+        "app_version_id": job.app_version_id,
+        "test_path": job.test_path,
+        "priority": job.priority,
+        "target": job.target.value,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at
+    }
+    
+    if job.result:
+        response["result"] = job.result
+    
+    if job.error_message:
+        response["error_message"] = job.error_message
+    
+    ttl = TERMINAL_JOB_CACHE_TTL if response["status"] in TERMINAL_STATUSES else JOB_CACHE_TTL
+    await async_redis_client.set(job_cache_key(job_id), orjson.dumps(response), ex=ttl)
+    
+    return response
+
+@app.get("/jobs/{job_id}", response_model=dict)
+async def get_job_status(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    try:
+        response = await get_job_cached(job_id, db)
+        if not response:
+            raise HTTPException(status_code=404, detail="Job not found")
         
         return response
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error getting job status for {job_id}: {str(e)}")
+        logger.error("Error getting job status for %s: %s", job_id, e)
         raise HTTPException(status_code=500, detail=f"Failed to get job status: {str(e)}")
 
+async def close_event_stream(pubsub):
+    """Free the stream's slot first, then close its connection shielded from a client disconnect's cancellation"""
+    event_streams.release()
+    with anyio.CancelScope(shield=True):
+        await pubsub.aclose()
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    # Refuse rather than queue: a waiting stream would still hold the client's connection open
+    if event_streams.locked():
+        raise HTTPException(status_code=503, detail="Too many open event streams", headers={"Retry-After": EVENTS_RETRY_AFTER})
+    await event_streams.acquire()
+    
+    # Subscribe before reading the current status so no transition is missed in between
+    pubsub = async_pubsub_client.pubsub()
+    try:
+        await pubsub.subscribe(events_channel(job_id))
+        # A short-lived session rather than a request dependency, which would hold its pooled
+        # connection until the stream ends
+        async with AsyncSessionLocal() as db:
+            job = (await db.execute(select(Job.status).where(Job.id == job_id))).scalar_one_or_none()
+    except Exception as e:
+        await close_event_stream(pubsub)
+        logger.error("Error opening event stream for %s: %s", job_id, e)
+        raise HTTPException(status_code=500, detail=f"Failed to open event stream: {str(e)}")
+    
+    if job is None:
+        await close_event_stream(pubsub)
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def event_stream():
+        try:
+            status = job.value
+            yield f"event: status\ndata: {orjson.dumps({'job_id': job_id, 'status': status}).decode()}\n\n"
+            
+            while status not in TERMINAL_STATUSES:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=EVENTS_KEEPALIVE_INTERVAL)
+                if message is None:
+                    yield ": keepalive\n\n"
+                    continue
+                
+                status = orjson.loads(message["data"])["status"]
+                yield f"event: status\ndata: {message['data']}\n\n"
+        finally:
+            await close_event_stream(pubsub)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @app.get("/jobs", response_model=List[dict])
 async def list_jobs(
+    response: Response,
     org_id: Optional[str] = None,
-    status: Optional[str] = None,
+    status: Optional[JobStatus] = None,
     app_version_id: Optional[str] = None,
-    limit: int = 100,
-    offset: int = 0,
-    db: Session = Depends(get_db)
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
-        query = db.query(Job)
-        
+        filters = []
         if org_id:
-            query = query.filter(Job.org_id == org_id)
+            filters.append(Job.org_id == org_id)
         if status:
-            query = query.filter(Job.status == status)
+            filters.append(Job.status == status)
         if app_version_id:
-            query = query.filter(Job.app_version_id == app_version_id)
+            filters.append(Job.app_version_id == app_version_id)
         
-        jobs = query.order_by(Job.created_at.desc()).offset(offset).limit(limit).all()
+        # Project only the listed columns; rows come back as tuples instead of hydrated ORM objects
+        query = select(*LIST_JOB_COLUMNS).where(*filters)
         
-        return [
-            {
-                "job_id": job.id,
-                "status": job.status.value,
-                "org_id": job.org_id,
-                "app_version_id": job.app_version_id,
-                "test_path": job.test_path,
-                "priority": job.priority,
-                "target": job.target.value,
-                "created_at": job.created_at.isoformat(),
-                "updated_at": job.updated_at.isoformat()
-            }
-            for job in jobs
-        ]
+        if cursor:
+            try:
+                cursor_created_at, cursor_id = decode_cursor(cursor)
+            except Exception:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            # Keyset pagination: seek past the last row instead of scanning `offset` rows
+            query = query.where(tuple_(Job.created_at, Job.id) < tuple_(cursor_created_at, cursor_id))
+        elif offset:
+            query = query.offset(offset)
         
+        query = query.order_by(Job.created_at.desc(), Job.id.desc()).limit(limit)
+        rows = (await db.execute(query)).all()
+        
+        count_key = f"jobs:count:{org_id or ''}:{status.value if status else ''}:{app_version_id or ''}"
+        total_count = await async_redis_client.get(count_key)
+        if total_count is None:
+            total_count = await db.scalar(select(func.count()).select_from(Job).where(*filters))
+            await async_redis_client.set(count_key, total_count, ex=JOB_COUNT_CACHE_TTL)
+        
+        response.headers["X-Total-Count"] = str(total_count)
+        if rows and len(rows) == limit:
+            response.headers["X-Next-Cursor"] = encode_cursor(rows[-1].created_at, rows[-1].job_id)
+        
+        # orjson serializes the str enums and datetimes natively
+        return [row._asdict() for row in rows]
+        
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error listing jobs: {str(e)}")
+        logger.error("Error listing jobs: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to list jobs: {str(e)}")
 
 @app.delete("/jobs/{job_id}")
-async def cancel_job(job_id: str, db: Session = Depends(get_db)):
+async def cancel_job(job_id: str, db: AsyncSession = Depends(get_async_db)):
     try:
-        job = db.query(Job).filter(Job.id == job_id).first()
-        if not job:
-            raise HTTPException(status_code=404, detail="Job not found")
+        # Check-and-update in one statement so two concurrent cancels can't both pass the status check
+        row = (await db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status.notin_([JobStatus.COMPLETED, JobStatus.FAILED]))
+            .values(status=JobStatus.FAILED, error_message="Job cancelled by user", updated_at=func.now())
+            .returning(Job.id)
+        )).first()
+        await db.commit()
         
-        if job.status in [JobStatus.COMPLETED, JobStatus.FAILED]:
+        if row is None:
+            if not await job_exists(job_id, db):
+                raise HTTPException(status_code=404, detail="Job not found")
             raise HTTPException(status_code=400, detail="Cannot cancel completed or failed job")
         
-        job.status = JobStatus.FAILED
-        job.error_message = "Job cancelled by user"
-        job.updated_at = datetime.now(timezone.utc)
-        db.commit()
-        
-        job_queue.update_job_status(job_id, JobStatus.FAILED)
+        await job_queue.update_job_status(job_id, JobStatus.FAILED)
         
-        logger.info(f"Job {job_id} cancelled")
+        logger.info("Job %s cancelled", job_id)
         
         return {"message": "Job cancelled successfully"}
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error cancelling job {job_id}: {str(e)}")
+        logger.error("Error cancelling job %s: %s", job_id, e)
         raise HTTPException(status_code=500, detail=f"Failed to cancel job: {str(e)}")
 
 @app.get("/health")
 async def health_check():
     try:
-        queue_size = job_queue.get_queue_size()
+        queue_size = await job_queue.get_queue_size()
         return {
             "status": "healthy",
             "timestamp": datetime.now(timezone.utc).isoformat(),
@@ -226,21 +495,28 @@ async def health_check():
             "service": "QualGent Job Orchestrator"
         }
     except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
+        logger.error("Health check failed: %s", e)
         raise HTTPException(status_code=503, detail="Service unhealthy")
 
 @app.get("/metrics")
-async def get_metrics(db: Session = Depends(get_db)):
+async def get_metrics(db: AsyncSession = Depends(get_async_db)):
     try:
-        total_jobs = db.query(Job).count()
-        queued_jobs = db.query(Job).filter(Job.status == JobStatus.QUEUED).count()
-        processing_jobs = db.query(Job).filter(Job.status == JobStatus.PROCESSING).count()
-        completed_jobs = db.query(Job).filter(Job.status == JobStatus.COMPLETED).count()
-        failed_jobs = db.query(Job).filter(Job.status == JobStatus.FAILED).count()
+        cached = await async_redis_client.get(METRICS_CACHE_KEY)
+        if cached:
+            return orjson.loads(cached)
         
-        queue_size = job_queue.get_queue_size()
+        rows = (await db.execute(select(Job.status, func.count()).group_by(Job.status))).all()
+        counts = {status: count for status, count in rows}
         
-        return {
+        total_jobs = sum(counts.values())
+        queued_jobs = counts.get(JobStatus.QUEUED, 0)
+        processing_jobs = counts.get(JobStatus.PROCESSING, 0)
+        completed_jobs = counts.get(JobStatus.COMPLETED, 0)
+        failed_jobs = counts.get(JobStatus.FAILED, 0)
+        
+        queue_size = await job_queue.get_queue_size()
+        
+        metrics = {
             "total_jobs": total_jobs,
             "queued_jobs": queued_jobs,
             "processing_jobs": processing_jobs,
@@ -250,49 +526,67 @@ async def get_metrics(db: Session = Depends(get_db)):
             "success_rate": (completed_jobs / total_jobs * 100) if total_jobs > 0 else 0
         }
         
+        # Short TTL absorbs dashboard polling bursts without serving stale data for long
+        await async_redis_client.set(METRICS_CACHE_KEY, orjson.dumps(metrics), ex=METRICS_CACHE_TTL)
+        
+        return metrics
+        
     except Exception as e:
-        logger.error(f"Error getting metrics: {str(e)}")
+        logger.error("Error getting metrics: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to get metrics: {str(e)}")
 
 @app.get("/jobs/{job_id}/retry")
-async def retry_job(job_id: str, db: Session = Depends(get_db)):
+async def retry_job(job_id: str, db: AsyncSession = Depends(get_async_db)):
     try:
-        job = db.query(Job).filter(Job.id == job_id).first()
-        if not job:
-            raise HTTPException(status_code=404, detail="Job not found")
+        # The pre-update error message is read in a scalar subquery so it can be restored if the queue is full
+        previous_error = select(Job.error_message).where(Job.id == job_id).scalar_subquery()
+        row = (await db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == JobStatus.FAILED)
+            .values(status=JobStatus.QUEUED, error_message=None, updated_at=func.now())
+            .returning(
+                Job.id, Job.org_id, Job.app_version_id, Job.test_path, Job.priority, Job.target,
+                previous_error.label("previous_error")
+            )
+        )).first()
+        await db.commit()
         
-        if job.status != JobStatus.FAILED:
+        if row is None:
+            if not await job_exists(job_id, db):
+                raise HTTPException(status_code=404, detail="Job not found")
             raise HTTPException(status_code=400, detail="Can only retry failed jobs")
         
-        job.status = JobStatus.QUEUED
-        job.error_message = None
-        job.updated_at = datetime.now(timezone.utc)
-        db.commit()
-        
-        job_queue.enqueue_job({
-            "id": job.id,
-            "org_id": job.org_id,
-            "app_version_id": job.app_version_id,
-            "test_path": job.test_path,
-            "priority": job.priority,
-            "target": job.target.value
-        })
+        try:
+            await job_queue.enqueue_job(job_payload(row))
+        except QueueFullError as e:
+            await db.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == JobStatus.QUEUED)
+                .values(status=JobStatus.FAILED, error_message=row.previous_error)
+            )
+            await db.commit()
+            raise queue_full_exception(e)
         
-        logger.info(f"Job {job_id} queued for retry")
+        logger.info("Job %s queued for retry", job_id)
         
         return {"message": "Job queued for retry"}
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error retrying job {job_id}: {str(e)}")
+        logger.error("Error retrying job %s: %s", job_id, e)
         raise HTTPException(status_code=500, detail=f"Failed to retry job: {str(e)}")
 
 if __name__ == "__main__":
     import uvicorn
+    # Import string rather than the app object so uvicorn can spawn multiple workers
     uvicorn.run(
-        app, 
+        "qgjob.main:app",
         host="0.0.0.0", 
         port=int(os.getenv("PORT", 8000)),
+        workers=WEB_CONCURRENCY,
+        loop="uvloop",
+        http="httptools",
+        access_log=False,
         log_level=os.getenv("LOG_LEVEL", "info").lower()
     )
@@ -1,5 +1,7 @@
-from sqlalchemy import Column, String, Integer, DateTime, Text, Enum as SQLEnum
-from sqlalchemy.orm import declarative_base
+from sqlalchemy import Column, String, Integer, SmallInteger, DateTime, Text, Index
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import declarative_base, deferred
 from sqlalchemy.sql import func
 from enum import Enum
 
@@ -16,6 +18,33 @@ class JobTarget(str, Enum):
     DEVICE = "device"
     BROWSERSTACK = "browserstack"
 
+class CodedEnum(TypeDecorator):
+    """Stores a str Enum as a SMALLINT code and loads it back as the member.
+
+    Codes are the members' declaration order, so new members must be appended, never reordered.
+    """
+    impl = SmallInteger
+    cache_ok = True
+    
+    def __init__(self, enum_class):
+        super().__init__()
+        self.enum_class = enum_class
+        self._members = tuple(enum_class)
+        self._codes = {member: code for code, member in enumerate(self._members)}
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return self._codes[self.enum_class(value)]
+    
+    def process_literal_param(self, value, dialect):
+        return str(self.process_bind_param(value, dialect))
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return self._members[value]
+
 class Job(Base):
     __tablename__ = "jobs"
     
@@ -24,9 +53,23 @@ class Job(Base):
     app_version_id = Column(String, nullable=False, index=True)
     test_path = Column(Text, nullable=False)
     priority = Column(Integer, default=5, server_default="5")
-    target = Column(SQLEnum(JobTarget), nullable=False)
-    status = Column(SQLEnum(JobStatus), default=JobStatus.QUEUED)
-    created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
-    result = Column(Text)
-    error_message = Column(Text)
+    # 2-byte codes instead of enum labels keep rows and the status indexes small
+    target = Column(CodedEnum(JobTarget), nullable=False)
+    # Defaults are filled in by the database so inserts can omit these columns; 0 is QUEUED's code
+    status = Column(CodedEnum(JobStatus), server_default="0", nullable=False, index=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+    # Potentially large (TOASTed) payloads, left out of ORM SELECTs unless a query undefers them
+    result = deferred(Column(JSONB))
+    error_message = deferred(Column(Text))
+    
+    __table_args__ = (
+        # Serves keyset pagination in GET /jobs as an index range scan
+        Index("ix_jobs_created_id", created_at.desc(), id.desc()),
+        # Partial index for pulling the next queued jobs (lowest priority value first, then FIFO);
+        # only queued rows are indexed so it stays small as finished jobs accumulate
+        Index("ix_jobs_dequeue", priority, created_at, postgresql_where=(status == JobStatus.QUEUED)),
+    )
+
+# Core table for hot insert paths that don't need the ORM unit of work
+jobs_table = Job.__table__
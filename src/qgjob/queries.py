@@ -0,0 +1,29 @@
+from datetime import timedelta
+from sqlalchemy import select, lambda_stmt, func, cast, literal, BigInteger
+from sqlalchemy.dialects.postgresql import BIT
+from .models import Job, JobStatus
+from .job_queue import QUEUE_SHARDS
+
+def app_version_shard(app_version_id):
+    """SQL counterpart of job_queue.queue_shard: the first 32 bits of the MD5, modulo QUEUE_SHARDS"""
+    md5_prefix = literal("x") + func.substr(func.md5(app_version_id), 1, 8)
+    return cast(cast(md5_prefix, BIT(32)), BigInteger) % QUEUE_SHARDS
+
+def dequeue_stmt(limit: int, grace: float, shards: tuple = ()):
+    """Next queued jobs, lowest priority value first then FIFO, skipping rows other workers hold.
+
+    Rows updated within `grace` seconds are left alone: their enqueue to Redis may still be in flight.
+    `shards` restricts the claim to those queue shards. Built as a lambda statement so the SQL is
+    compiled once and cached; `limit`, the grace interval and the shards become bound parameters.
+    """
+    grace_interval = timedelta(seconds=grace)
+    stmt = lambda_stmt(
+        lambda: select(Job)
+        .where(Job.status == JobStatus.QUEUED, Job.updated_at < func.now() - grace_interval)
+        .order_by(Job.priority.asc(), Job.created_at.asc())
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    if shards:
+        stmt += lambda s: s.where(app_version_shard(Job.app_version_id).in_(shards))
+    return stmt
@@ -1,46 +1,107 @@
 import time
-import json
 import logging
 import os
 import sys
+import queue
+import zlib
+from contextlib import contextmanager
+from collections import Counter, defaultdict
+from enum import Enum
 from typing import Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta, timezone
-from sqlalchemy.orm import sessionmaker
-from .database import engine, redis_client
+from logging.handlers import QueueHandler, QueueListener
+from sqlalchemy import func, select, text, update
+from sqlalchemy.orm import scoped_session, sessionmaker
+from .database import engine, redis_client, PGBOUNCER, POOL_OPTIONS
 from .models import Job, JobStatus
-from .job_queue import JobQueue
+from .job_queue import JobQueue, queue_score
+from .queries import dequeue_stmt
 from .test_executor import TestExecutor
-from filelock import FileLock
 
-# Configure production logging for worker
+# Configure production logging for worker; job threads only enqueue records and a
+# background listener does the stdout and file writes
+log_queue = queue.Queue(-1)
+log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+log_stream_handler = logging.StreamHandler(sys.stdout)
+log_stream_handler.setFormatter(log_formatter)
+log_file_handler = logging.FileHandler('qgjob-worker.log')
+log_file_handler.setFormatter(log_formatter)
+log_listener = QueueListener(log_queue, log_stream_handler, log_file_handler, respect_handler_level=True)
+
+# force=True replaces any handler installed while importing the modules above
 logging.basicConfig(
     level=os.getenv("LOG_LEVEL", "INFO"),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('qgjob-worker.log')
-    ]
+    format='%(message)s',
+    handlers=[QueueHandler(log_queue)],
+    force=True
 )
 
 logger = logging.getLogger(__name__)
 
+# Seconds an idle worker waits on Redis before re-checking the database and stale jobs
+IDLE_WAIT = 5
+# Stale jobs are only failed after an hour, so the sweep need not run on every loop iteration
+STALE_CHECK_INTERVAL = int(os.getenv("STALE_CHECK_INTERVAL", "60"))
+# Held by whichever worker ran the last sweep until the interval is up, so only one sweeps per interval
+CLEANUP_LOCK_KEY = "qgjob:cleanup_lock"
+# Finished rows are written once this many are buffered, or once the oldest has waited this many
+# seconds, rather than at the end of a group that can run for hours
+FINISHED_FLUSH_SIZE = int(os.getenv("FINISHED_FLUSH_SIZE", "20"))
+FINISHED_FLUSH_INTERVAL = float(os.getenv("FINISHED_FLUSH_INTERVAL", "5"))
+# Buffered rows are written within seconds; a finishing flag older than this belongs to a dead worker
+FINISHING_MAX_AGE = 300
+# Longest a group held by another worker is parked before this worker tries its lock again
+GROUP_BUSY_MAX_DELAY = int(os.getenv("GROUP_BUSY_MAX_DELAY", "60"))
+
+def retry_delay(attempt: int) -> float:
+    """Exponential backoff between job attempts: 2s, 4s, 8s, ... capped at 30s"""
+    return min(2 ** attempt, 30)
+
+class JobOutcome(str, Enum):
+    """What one process_single_job call did with its job"""
+    COMPLETED = "completed"
+    FAILED = "failed"
+    # Handed back to the queue for another attempt
+    RETRYING = "retrying"
+    # Not run: missing, already claimed by another worker, or already finished
+    SKIPPED = "skipped"
+
 class JobWorker:
     def __init__(self, worker_id: Optional[str] = None):
         self.worker_id = worker_id or f"worker-{os.getpid()}"
-        logger.info(f"Initializing QualGent Job Worker {self.worker_id} in production mode")
+        logger.info("Initializing QualGent Job Worker %s in production mode", self.worker_id)
 
         # Validate production dependencies
         self._validate_production_dependencies()
 
         try:
-            self.job_queue = JobQueue()
+            # Serve only these queue shards (e.g. "0,2"); unset serves them all
+            shards = os.getenv("WORKER_SHARDS")
+            self.shards = tuple(int(shard) for shard in shards.split(",")) if shards else ()
+            self.job_queue = JobQueue(list(self.shards) or None)
             self.executor = TestExecutor()
-            self.SessionLocal = sessionmaker(bind=engine)
-            self.grouped_jobs = {}
+            # Thread-local sessions: group jobs run on a thread pool
+            self.Session = scoped_session(sessionmaker(bind=engine, expire_on_commit=False))
+            self.grouped_jobs = defaultdict(list)
+            # Consecutive times each app version's lock was found held, for the busy-group backoff
+            self.busy_groups = Counter()
             self.max_retries = int(os.getenv("MAX_JOB_RETRIES", "3"))
-            logger.info(f"Job Worker {self.worker_id} initialized successfully")
+            self.db_claim_batch = int(os.getenv("DB_CLAIM_BATCH", "10"))
+            # Matches the API's enqueue sweep: younger QUEUED rows may still be on their way into Redis
+            self.db_claim_grace = float(os.getenv("DB_CLAIM_GRACE", "30"))
+            # Concurrent BrowserStack sessions per group; keep within the account's parallel quota
+            self.parallel = int(os.getenv("BROWSERSTACK_PARALLEL", "5"))
+            # Long-lived so job threads (and their thread-local sessions) are reused across groups
+            self.job_pool = ThreadPoolExecutor(max_workers=self.parallel, thread_name_prefix=f"{self.worker_id}-job")
+            # Each job thread, the group's advisory lock and the main loop can hold a connection at once
+            if self.parallel + 2 > POOL_OPTIONS["pool_size"] + POOL_OPTIONS["max_overflow"]:
+                logger.warning("DB pool (%d + %d overflow) is smaller than BROWSERSTACK_PARALLEL + 2; "
+                               "raise DB_POOL_SIZE or jobs will wait on connections",
+                               POOL_OPTIONS["pool_size"], POOL_OPTIONS["max_overflow"])
+            logger.info("Job Worker %s initialized successfully", self.worker_id)
         except Exception as e:
-            logger.error(f"Failed to initialize Job Worker {self.worker_id}: {e}")
+            logger.error("Failed to initialize Job Worker %s: %s", self.worker_id, e)
             raise RuntimeError(f"Worker initialization failed: {e}")
 
     def _validate_production_dependencies(self):
@@ -62,198 +123,342 @@ class JobWorker:
             logger.error(error_msg)
             logger.error("Worker requires all production dependencies to be configured")
             raise RuntimeError(error_msg)
-        self.processing_lock = FileLock(f"/tmp/worker-{self.worker_id}.lock")
         
-        logger.info(f"Worker {self.worker_id} initialized")
+        logger.info("Worker %s initialized", self.worker_id)
     
     def get_db_session(self):
-        """Create a new database session"""
-        return self.SessionLocal()
+        """Return the calling thread's database session"""
+        return self.Session()
     
-    def group_jobs_by_app_version(self):
-        jobs_to_process = []
+    def group_jobs_by_app_version(self, block_timeout: int = 0):
+        """Take the next batch of queued jobs into app version groups; with block_timeout, first wait that long for a job"""
+        # One batch per cycle: a single round-trip, and the rest of a deep queue is left
+        # for other workers instead of being hoarded by whichever one polled first
+        if block_timeout:
+            jobs_to_process = self.job_queue.dequeue_batch_blocking(timeout=block_timeout)
+        else:
+            jobs_to_process = self.job_queue.dequeue_batch()
         
-        while True:
-            job = self.job_queue.dequeue_job()
-            if not job:
-                break
+        for job in jobs_to_process:
+            self.grouped_jobs[job["app_version_id"]].append(job)
+        
+        logger.info("Grouped %d jobs into %d app version groups", len(jobs_to_process), len(self.grouped_jobs))
+        return self.grouped_jobs
+    
+    def claim_jobs_from_database(self):
+        """Fallback when Redis has nothing: claim queued rows directly, e.g. jobs lost from Redis.
+
+        SKIP LOCKED lets several workers claim disjoint rows without waiting on each other. Only rows
+        past the enqueue grace period and in this worker's shards are taken.
+        """
+        session = self.get_db_session()
+        try:
+            db_jobs = session.execute(dequeue_stmt(self.db_claim_batch, self.db_claim_grace, self.shards)).scalars().all()
+            if not db_jobs:
+                return {}
             
-            app_version_id = job["app_version_id"]
-            if app_version_id not in self.grouped_jobs:
-                self.grouped_jobs[app_version_id] = []
+            now = datetime.now(timezone.utc)
+            for db_job in db_jobs:
+                db_job.status = JobStatus.PROCESSING
+                db_job.updated_at = now
+            session.commit()
             
-            self.grouped_jobs[app_version_id].append(job)
-            jobs_to_process.append(job)
+            jobs = [
+                {
+                    "id": db_job.id,
+                    "org_id": db_job.org_id,
+                    "app_version_id": db_job.app_version_id,
+                    "test_path": db_job.test_path,
+                    "priority": db_job.priority,
+                    "target": db_job.target.value,
+                    # Its place in the queue had it been enqueued at creation, for retry_later
+                    "score": queue_score({"priority": db_job.priority},
+                                         db_job.created_at.replace(tzinfo=timezone.utc).timestamp()),
+                    "claimed": True
+                }
+                for db_job in db_jobs
+            ]
+        finally:
+            self.Session.remove()
         
-        logger.info(f"Grouped {len(jobs_to_process)} jobs into {len(self.grouped_jobs)} app version groups")
+        self.job_queue.remove_jobs(jobs)
+        self.job_queue.update_job_statuses([(job["id"], JobStatus.PROCESSING) for job in jobs])
+        for job in jobs:
+            self.grouped_jobs[job["app_version_id"]].append(job)
+        
+        logger.info("Claimed %d queued jobs from the database", len(jobs))
         return self.grouped_jobs
     
+    @contextmanager
+    def group_lock(self, app_version_id: str):
+        """Try for a Postgres advisory lock on the app version so one worker at a time runs its jobs, across hosts.
+
+        Yields whether the lock was taken; it never waits, so a busy group can't stall this worker's loop.
+        """
+        if PGBOUNCER:
+            # Session-level advisory locks don't survive PgBouncer's transaction pooling
+            yield True
+            return
+        
+        key = zlib.crc32(app_version_id.encode())
+        # Autocommit so the lock holder isn't an idle-in-transaction connection for the whole group
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            if not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": key}).scalar():
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+    
     def process_job_group(self, app_version_id: str, jobs: list):
-        logger.info(f"Processing {len(jobs)} jobs for app_version_id: {app_version_id}")
+        logger.info("Processing %d jobs for app_version_id: %s", len(jobs), app_version_id)
         
-        jobs.sort(key=lambda x: x.get("priority", 5))
+        # No sort needed: a group's jobs all come from one queue shard popped in score order, or
+        # from the database claim ordered by priority, so they already arrive highest priority first
+        start_time = time.monotonic()
+        outcomes = Counter()
+        finished = []
         
-        start_time = time.time()
-        successful_jobs = 0
-        failed_jobs = 0
+        with self.group_lock(app_version_id) as locked:
+            if not locked:
+                # Another worker is running this group: park the jobs rather than wait on it, backing
+                # off so they aren't promoted straight back into a lock attempt on every dequeue
+                delay = min(IDLE_WAIT * 2 ** self.busy_groups[app_version_id], GROUP_BUSY_MAX_DELAY)
+                self.busy_groups[app_version_id] += 1
+                logger.info("Group %s is running on another worker, re-queueing %d jobs in %ds",
+                            app_version_id, len(jobs), delay)
+                self.job_queue.retry_jobs_later(jobs, delay)
+                return
+            self.busy_groups.pop(app_version_id, None)
+            
+            # Jobs are remote-I/O bound, so threads overlap the BrowserStack sessions; each job
+            # opens its own DB session. Submission order keeps higher-priority jobs starting first.
+            futures = {self.job_pool.submit(self.process_single_job, job): job for job in jobs}
+            pending = set(futures)
+            flush_at = None
+            while pending:
+                timeout = max(flush_at - time.monotonic(), 0) if flush_at else None
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                rows = []
+                for future in done:
+                    try:
+                        outcome, row = future.result()
+                    except Exception as e:
+                        logger.error("Unexpected error processing job %s: %s", futures[future]["id"], e)
+                        outcome, row = JobOutcome.FAILED, None
+                    outcomes[outcome] += 1
+                    if row:
+                        rows.append(row)
+                
+                if rows:
+                    # Until written these rows are still PROCESSING in the database
+                    self.job_queue.mark_finishing([row["id"] for row in rows])
+                    finished += rows
+                    flush_at = flush_at or time.monotonic() + FINISHED_FLUSH_INTERVAL
+                
+                if finished and (not pending or len(finished) >= FINISHED_FLUSH_SIZE or time.monotonic() >= flush_at):
+                    try:
+                        self.save_finished_jobs(finished)
+                        finished = []
+                        flush_at = None
+                    except Exception as e:
+                        if not pending:
+                            raise
+                        # Other jobs are still running: keep the rows and try again on the next flush
+                        logger.error("Error saving %d finished jobs, retrying: %s", len(finished), e)
+                        flush_at = time.monotonic() + FINISHED_FLUSH_INTERVAL
         
-        for job in jobs:
-            try:
-                success = self.process_single_job(job)
-                if success:
-                    successful_jobs += 1
-                else:
-                    failed_jobs += 1
-            except Exception as e:
-                logger.error(f"Unexpected error processing job {job['id']}: {str(e)}")
-                failed_jobs += 1
+        total_time = time.monotonic() - start_time
+        logger.info("Group %s completed in %.2fs: %d successful, %d failed, %d retrying, %d skipped",
+                    app_version_id, total_time, outcomes[JobOutcome.COMPLETED], outcomes[JobOutcome.FAILED],
+                    outcomes[JobOutcome.RETRYING], outcomes[JobOutcome.SKIPPED])
+    
+    def save_finished_jobs(self, rows: list):
+        """Write a batch of terminal statuses in one transaction, then publish them to Redis.
+
+        Every row carries the same keys, so the ORM sends them as a single executemany.
+        """
+        if not rows:
+            return
+        
+        # One timestamp for the whole batch; it is the moment the rows are written
+        now = datetime.now(timezone.utc)
+        for row in rows:
+            row["updated_at"] = now
+        
+        session = self.get_db_session()
+        try:
+            session.bulk_update_mappings(Job, rows)
+            session.commit()
+        finally:
+            self.Session.remove()
         
-        total_time = time.time() - start_time
-        logger.info(f"Group {app_version_id} completed in {total_time:.2f}s: {successful_jobs} successful, {failed_jobs} failed")
+        self.job_queue.update_job_statuses([(row["id"], row["status"]) for row in rows])
+        self.job_queue.clear_finishing([row["id"] for row in rows])
     
-    def process_single_job(self, job_data: dict) -> bool:
+    def process_single_job(self, job_data: dict) -> tuple[JobOutcome, Optional[dict]]:
+        """Run one attempt of a job, returning (outcome, terminal row for save_finished_jobs or None).
+
+        A failed attempt with retries left is handed back to the queue with a backoff delay and
+        reported as RETRYING, so the thread moves on instead of sleeping.
+        """
         job_id = job_data["id"]
-        retry_count = 0
+        retry_count = job_data.get("retry_count", 0)
+        # Jobs claimed from the database, and retries, are already PROCESSING there
+        if not job_data.get("claimed") and not self.start_job(job_id):
+            return JobOutcome.SKIPPED, None
         
-        while retry_count <= self.max_retries:
-            session = self.get_db_session()
-            try:
-                logger.info(f"Processing job {job_id} (attempt {retry_count + 1})")
-                
-                db_job = session.query(Job).filter(Job.id == job_id).first()
-                if not db_job:
-                    logger.error(f"Job {job_id} not found in database")
-                    return False
-                
-                if db_job.status == JobStatus.COMPLETED:
-                    logger.info(f"Job {job_id} already completed, skipping")
-                    return True
-                
-                self.update_job_status(db_job, JobStatus.PROCESSING, session)
-                
-                start_time = time.time()
-                result = self.executor.execute_test(job_data)
-                execution_time = time.time() - start_time
-                
-                if result["success"]:
-                    db_job.status = JobStatus.COMPLETED
-                    db_job.result = json.dumps({
+        failure_result = None
+        try:
+            logger.info("Processing job %s (attempt %d)", job_id, retry_count + 1)
+            
+            start_time = time.monotonic()
+            result = self.executor.execute_test(job_data)
+            execution_time = time.monotonic() - start_time
+            
+            if result["success"]:
+                logger.info("Job %s completed successfully in %.2fs", job_id, execution_time)
+                return JobOutcome.COMPLETED, {
+                    "id": job_id,
+                    "status": JobStatus.COMPLETED,
+                    "error_message": None,
+                    "result": {
                         "success": True,
                         "video_url": result.get("video_url"),
                         "test_results": result.get("test_results"),
                         "session_id": result.get("session_id"),
                         "browserstack_url": result.get("browserstack_url"),
                         "execution_time": execution_time
-                    })
-                    
-                    session.commit()
-                    self.job_queue.update_job_status(job_id, JobStatus.COMPLETED)
-                    
-                    logger.info(f"Job {job_id} completed successfully in {execution_time:.2f}s")
-                    return True
-                else:
-                    error_msg = result.get("error", "Test execution failed")
-                    
-                    if retry_count < self.max_retries:
-                        retry_count += 1
-                        logger.warning(f"Job {job_id} failed (attempt {retry_count}), retrying: {error_msg}")
-                        time.sleep(min(2 ** retry_count, 30))
-                        continue
-                    else:
-                        db_job.status = JobStatus.FAILED
-                        db_job.error_message = error_msg
-                        db_job.result = json.dumps({
-                            "success": False,
-                            "error": error_msg,
-                            "test_results": result.get("test_results"),
-                            "execution_time": execution_time,
-                            "retry_count": retry_count
-                        })
-                        
-                        session.commit()
-                        self.job_queue.update_job_status(job_id, JobStatus.FAILED)
-                        
-                        logger.error(f"Job {job_id} failed after {retry_count} retries: {error_msg}")
-                        return False
-                
-            except Exception as e:
-                error_msg = f"Job processing error: {str(e)}"
-                logger.error(f"Job {job_id} error (attempt {retry_count + 1}): {error_msg}")
-                
-                if retry_count < self.max_retries:
-                    retry_count += 1
-                    time.sleep(min(2 ** retry_count, 30))
-                    continue
-                else:
-                    db_job = session.query(Job).filter(Job.id == job_id).first()
-                    if db_job:
-                        db_job.status = JobStatus.FAILED
-                        db_job.error_message = error_msg
-                        db_job.updated_at = datetime.now(timezone.utc)
-                        session.commit()
-                    
-                    self.job_queue.update_job_status(job_id, JobStatus.FAILED)
-                    return False
-            finally:
-                session.close()
+                    }
+                }
+            
+            error_msg = result.get("error", "Test execution failed")
+            failure_result = {
+                "success": False,
+                "error": error_msg,
+                "test_results": result.get("test_results"),
+                "execution_time": execution_time,
+                "retry_count": retry_count
+            }
+        except Exception as e:
+            error_msg = f"Job processing error: {str(e)}"
+            logger.error("Job %s error (attempt %d): %s", job_id, retry_count + 1, error_msg)
+        
+        if retry_count < self.max_retries:
+            retry_count += 1
+            logger.warning("Job %s failed (attempt %d), retrying: %s", job_id, retry_count, error_msg)
+            self.job_queue.retry_later({**job_data, "claimed": True, "retry_count": retry_count}, retry_delay(retry_count))
+            return JobOutcome.RETRYING, None
         
-        return False
+        logger.error("Job %s failed after %d retries: %s", job_id, retry_count, error_msg)
+        return JobOutcome.FAILED, {"id": job_id, "status": JobStatus.FAILED, "error_message": error_msg, "result": failure_result}
     
-    def update_job_status(self, db_job: Job, status: JobStatus, session):
-        db_job.status = status
-        db_job.updated_at = datetime.now(timezone.utc)
-        session.commit()
-        self.job_queue.update_job_status(db_job.id, status)
+    def start_job(self, job_id: str) -> bool:
+        """Move a queued job to PROCESSING in one conditional UPDATE; False means it must not run"""
+        session = self.get_db_session()
+        try:
+            started = session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == JobStatus.QUEUED)
+                .values(status=JobStatus.PROCESSING, updated_at=func.now())
+                .returning(Job.id)
+                .execution_options(synchronize_session=False)
+            ).first()
+            session.commit()
+            
+            if not started:
+                # Rare path: report why the job was skipped
+                status = session.execute(select(Job.status).where(Job.id == job_id)).scalar()
+                if status is None:
+                    logger.error("Job %s not found in database", job_id)
+                elif status == JobStatus.PROCESSING:
+                    # Another worker claimed it from the database before it left Redis
+                    logger.info("Job %s already claimed by another worker, skipping", job_id)
+                else:
+                    logger.info("Job %s already %s, skipping", job_id, status.value)
+                return False
+        finally:
+            self.Session.remove()
+        
+        self.job_queue.update_job_status(job_id, JobStatus.PROCESSING)
+        return True
     
     def cleanup_stale_jobs(self):
+        # Single-flight across workers and hosts; the key is left to expire rather than deleted
+        if not redis_client.set(CLEANUP_LOCK_KEY, self.worker_id, nx=True, ex=STALE_CHECK_INTERVAL):
+            return
+        
+        # Jobs that finished but whose results are still buffered in a worker aren't stale
+        finishing = self.job_queue.get_finishing(FINISHING_MAX_AGE)
+        
         session = self.get_db_session()
         try:
-            cutoff_time = datetime.now(timezone.utc) - timedelta(hours=1)
-            stale_jobs = session.query(Job).filter(
-                Job.status == JobStatus.PROCESSING,
-                Job.updated_at < cutoff_time
-            ).all()
-            
-            for job in stale_jobs:
-                logger.warning(f"Cleaning up stale job {job.id}")
-                job.status = JobStatus.FAILED
-                job.error_message = "Job timeout - no updates for over 1 hour"
-                job.updated_at = datetime.now(timezone.utc)
+            now = datetime.now(timezone.utc)
+            cutoff_time = now - timedelta(hours=1)
+            stale_ids = session.execute(
+                update(Job)
+                .where(Job.status == JobStatus.PROCESSING, Job.updated_at < cutoff_time, Job.id.notin_(finishing))
+                .values(
+                    status=JobStatus.FAILED,
+                    error_message="Job timeout - no updates for over 1 hour",
+                    updated_at=now
+                )
+                .returning(Job.id)
+                .execution_options(synchronize_session=False)
+            ).scalars().all()
             
             session.commit()
-            logger.info(f"Cleaned up {len(stale_jobs)} stale jobs")
         finally:
-            session.close()
+            self.Session.remove()
+        
+        if not stale_ids:
+            return
+        
+        # Keep Redis status keys and counters in line with the rows just failed
+        self.job_queue.update_job_statuses([(job_id, JobStatus.FAILED) for job_id in stale_ids])
+        logger.info("Cleaned up %d stale jobs", len(stale_ids))
     
     def run(self):
-        logger.info(f"Worker {self.worker_id} started...")
+        logger.info("Worker %s started...", self.worker_id)
+        next_cleanup = 0.0
         
         while True:
             try:
-                with self.processing_lock:
+                # While batches keep coming back the loop goes straight to the next dequeue;
+                # the stale sweep is the only other per-iteration cost, so it runs on a timer
+                if time.monotonic() >= next_cleanup:
                     self.cleanup_stale_jobs()
-                    
-                    grouped_jobs = self.group_jobs_by_app_version()
-                    
+                    next_cleanup = time.monotonic() + STALE_CHECK_INTERVAL
+                
+                grouped_jobs = self.group_jobs_by_app_version() or self.claim_jobs_from_database()
+                
+                if not grouped_jobs:
+                    # Block on Redis rather than sleeping so a new job starts as soon as it is enqueued
+                    logger.debug("No jobs to process, waiting...")
+                    grouped_jobs = self.group_jobs_by_app_version(block_timeout=IDLE_WAIT)
                     if not grouped_jobs:
-                        logger.debug("No jobs to process, waiting...")
-                        time.sleep(5)
                         continue
-                    
-                    for app_version_id, jobs in grouped_jobs.items():
-                        self.process_job_group(app_version_id, jobs)
-                    
-                    self.grouped_jobs.clear()
+                
+                for app_version_id, jobs in grouped_jobs.items():
+                    self.process_job_group(app_version_id, jobs)
+                
+                self.grouped_jobs.clear()
                 
             except KeyboardInterrupt:
-                logger.info(f"Worker {self.worker_id} shutting down...")
+                logger.info("Worker %s shutting down...", self.worker_id)
                 break
             except Exception as e:
-                logger.error(f"Worker {self.worker_id} error: {e}")
+                logger.error("Worker %s error: %s", self.worker_id, e)
                 time.sleep(10)
         
-        logger.info(f"Worker {self.worker_id} stopped")
+        self.job_pool.shutdown(wait=True)
+        logger.info("Worker %s stopped", self.worker_id)
 
 if __name__ == "__main__":
-    worker = JobWorker()
-    worker.run()
+    log_listener.start()
+    try:
+        worker = JobWorker()
+        worker.run()
+    finally:
+        log_listener.stop()
@@ -0,0 +1,16 @@
+import pytest
+import pytest_asyncio
+
+from qgjob.database import create_tables, async_engine, async_redis_client, async_pubsub_client
+
+@pytest.fixture(scope="session", autouse=True)
+def tables():
+    create_tables()
+
+@pytest_asyncio.fixture(autouse=True)
+async def release_connections():
+    """The engine and Redis pools are module-level, but each test runs on its own event loop"""
+    yield
+    await async_engine.dispose()
+    await async_redis_client.connection_pool.disconnect()
+    await async_pubsub_client.connection_pool.disconnect()
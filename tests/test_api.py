@@ -0,0 +1,133 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from sqlalchemy import insert
+
+import qgjob.main as api
+from qgjob.database import AsyncSessionLocal
+from qgjob.models import JobStatus, JobTarget, jobs_table
+
+async def add_jobs(count: int, **values) -> tuple:
+    """Insert count jobs for a fresh org, one second apart; returns (org_id, ids oldest first).
+
+    They are inserted already finished, so a worker sharing the database never claims them.
+    """
+    org_id = f"org-{uuid.uuid4()}"
+    created_at = datetime.utcnow() - timedelta(seconds=count)
+    rows = [
+        {
+            "id": str(uuid.uuid4()),
+            "org_id": org_id,
+            "app_version_id": "app-1",
+            "test_path": "tests/sample.spec.js",
+            "target": JobTarget.EMULATOR,
+            "status": JobStatus.COMPLETED,
+            "created_at": created_at + timedelta(seconds=i),
+            **values
+        }
+        for i in range(count)
+    ]
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(jobs_table), rows)
+        await db.commit()
+    return org_id, [row["id"] for row in rows]
+
+def client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://test")
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("query", ["limit=0", "limit=-1", "limit=1001", "offset=-1"])
+async def test_list_jobs_rejects_out_of_range_paging(query):
+    async with client() as c:
+        response = await c.get(f"/jobs?{query}")
+    assert response.status_code == 422
+
+@pytest.mark.asyncio
+async def test_list_jobs_cursor_walks_newest_first():
+    org_id, job_ids = await add_jobs(3)
+
+    async with client() as c:
+        first = await c.get("/jobs", params={"org_id": org_id, "limit": 2})
+        assert first.status_code == 200
+        assert [job["job_id"] for job in first.json()] == job_ids[:0:-1]
+        assert first.headers["X-Total-Count"] == "3"
+
+        last = await c.get("/jobs", params={"org_id": org_id, "limit": 2, "cursor": first.headers["X-Next-Cursor"]})
+
+    assert last.status_code == 200
+    assert [job["job_id"] for job in last.json()] == job_ids[:1]
+    assert "X-Next-Cursor" not in last.headers
+
+@pytest.mark.asyncio
+async def test_list_jobs_cursor_past_the_last_row_is_empty():
+    org_id, _ = await add_jobs(2)
+
+    async with client() as c:
+        # A full page still gets a cursor, since the server can't tell it was the last one
+        full = await c.get("/jobs", params={"org_id": org_id, "limit": 2})
+        empty = await c.get("/jobs", params={"org_id": org_id, "limit": 2, "cursor": full.headers["X-Next-Cursor"]})
+
+    assert empty.status_code == 200
+    assert empty.json() == []
+    assert "X-Next-Cursor" not in empty.headers
+
+@pytest.mark.asyncio
+async def test_list_jobs_rejects_invalid_cursor():
+    async with client() as c:
+        response = await c.get("/jobs", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+async def open_and_drop_event_stream(job_id: str) -> int:
+    """Call the ASGI app directly: read the first event, then disconnect as `qgjob wait` does on timeout"""
+    first_event = asyncio.Event()
+    requested = False
+    statuses = []
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await first_event.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+        elif message.get("body"):
+            first_event.set()
+
+    path = f"/jobs/{job_id}/events"
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "", "headers": [],
+        "client": ("test", 50000), "server": ("test", 80)
+    }
+    await asyncio.wait_for(api.app(scope, receive, send), timeout=10)
+    return statuses[0]
+
+@pytest.mark.asyncio
+async def test_event_stream_slot_is_freed_on_disconnect(monkeypatch):
+    monkeypatch.setattr(api, "event_streams", asyncio.Semaphore(2))
+    _, (job_id,) = await add_jobs(1)
+
+    # More disconnects than slots: a leaked slot would turn the later streams into 503s
+    statuses = [await open_and_drop_event_stream(job_id) for _ in range(4)]
+
+    assert statuses == [200] * 4
+    assert not api.event_streams.locked()
+
+@pytest.mark.asyncio
+async def test_event_stream_refused_when_slots_are_taken(monkeypatch):
+    monkeypatch.setattr(api, "event_streams", asyncio.Semaphore(1))
+    _, (job_id,) = await add_jobs(1)
+    await api.event_streams.acquire()
+
+    async with client() as c:
+        response = await c.get(f"/jobs/{job_id}/events")
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == api.EVENTS_RETRY_AFTER